@@ -0,0 +1,67 @@
+import logging, os, tempfile
+from contextlib import suppress
+
+log = logging.getLogger("agent")
+
+
+class DiskCache:
+    """Bytes stored as <key>.json files in one directory, capped at max_entries.
+    Writes go through a unique temp file and an atomic rename, so concurrent writers of one key never
+    interleave. Hits refresh the file's mtime; past the cap the least recently used entries are deleted."""
+
+    def __init__(self, directory: str, max_entries: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        # Approximate entry count (overwrites and other processes' writes are not tracked), so the
+        # directory is only listed when the cap may have been crossed; None until the first listing
+        self._count: int | None = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                data = fh.read()
+        except OSError:
+            return None
+        with suppress(OSError):
+            os.utime(path)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as fh:
+                    fh.write(data)
+                os.replace(tmp, self._path(key))
+            except BaseException:
+                with suppress(OSError):
+                    os.unlink(tmp)
+                raise
+        except OSError as e:
+            log.warning("Could not write cache entry %s in %s: %s", key, self.directory, e)
+            return
+        if self._count is not None:
+            self._count += 1
+        if self._count is None or self._count > self.max_entries:
+            self._evict()
+
+    def _evict(self) -> None:
+        # Trim to 90% of the cap, so the next listing is at least max_entries/10 writes away
+        try:
+            with os.scandir(self.directory) as it:
+                entries = [(e.stat().st_mtime, e.path) for e in it if e.name.endswith(".json")]
+        except OSError:
+            return
+        self._count = len(entries)
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries * 9 // 10]:
+            with suppress(OSError):
+                os.remove(path)
+                self._count -= 1
@@ -1,21 +1,116 @@
-import os
+import asyncio, hashlib, logging, os
+from functools import lru_cache
+from typing import Any
+from pydantic import BaseModel
+from langchain_core.messages import HumanMessage, SystemMessage
+from app.disk_cache import DiskCache
 
+# Resolve the provider once at import so its SDK import cost is paid at startup, not on the first request
+USE_BEDROCK = os.getenv("AWS_BEDROCK", "").lower() in ("1", "true", "yes")
+
+if USE_BEDROCK:
+    from botocore.config import Config
+    from langchain_aws import ChatBedrockConverse
+else:
+    from langchain_anthropic import ChatAnthropic
+
+log = logging.getLogger("agent")
+
+# Enough pooled connections for concurrent page generation (boto3 defaults to 10)
+MAX_CONNECTIONS = 32
+# SDK-level retries back off with jitter on 429/529 (honoring Retry-After), so higher
+# page concurrency degrades into waiting rather than failed pages
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+
+# Structured LLM results persisted across runs, keyed by model + prompt digest. Opt-in: a hit replays
+# the stored output, so re-running an unchanged repo reproduces the same pages until the entry is evicted
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+_llm_cache = DiskCache(LLM_CACHE_DIR, LLM_CACHE_MAX_ENTRIES) if LLM_CACHE_DIR else None
+
+
+@lru_cache(maxsize=1)
 def get_llm():
-    """Return a ChatModel — uses Bedrock if AWS creds are set, otherwise direct Anthropic."""
+    """Return a ChatModel — uses Bedrock if AWS creds are set, otherwise direct Anthropic.
+    Cached so every node shares one client and its connection pool."""
     model = os.getenv("LLM_MODEL", "claude-sonnet-4-20250514")
     max_tokens = int(os.getenv("LLM_MAX_TOKENS", "8192"))
 
-    if os.getenv("AWS_BEDROCK", "").lower() in ("1", "true", "yes"):
-        from langchain_aws import ChatBedrockConverse
+    if USE_BEDROCK:
         return ChatBedrockConverse(
             model=os.getenv("BEDROCK_MODEL_ID", f"anthropic.{model}"),
             region_name=os.getenv("AWS_REGION", "us-east-1"),
             max_tokens=max_tokens,
+            config=Config(max_pool_connections=MAX_CONNECTIONS, retries={"max_attempts": MAX_RETRIES, "mode": "adaptive"}),
         )
 
-    from langchain_anthropic import ChatAnthropic
+    # The Anthropic SDK's shared httpx client already pools far more than MAX_CONNECTIONS
     return ChatAnthropic(
         model=model,
         api_key=os.getenv("ANTHROPIC_API_KEY"),
         max_tokens=max_tokens,
+        max_retries=MAX_RETRIES,
     )
+
+
+async def warm_up(timeout: float = 15) -> None:
+    """Send a 1-token request so the first user request reuses an open TLS connection.
+    Disabled with LLM_WARMUP=0; failures are logged and otherwise ignored."""
+    if os.getenv("LLM_WARMUP", "1").lower() in ("0", "false", "no"):
+        return
+    try:
+        await asyncio.wait_for(get_llm().bind(max_tokens=1).ainvoke([HumanMessage(content="ok")]), timeout=timeout)
+        log.info("LLM connection warmed up")
+    except Exception as e:
+        log.warning("LLM warm-up failed: %s", e)
+
+
+# In-flight structured calls of one generation, keyed by prompt digest
+InvokeCache = dict[str, asyncio.Task]
+
+
+def _prompt_messages(system: str, user: str, shared: str = "") -> list:
+    """Build [system, human] messages. On Anthropic the system prompt and the shared prefix
+    (identical for every page of a repo) are marked cacheable, so later pages only prefill
+    the per-page suffix. Bedrock Converse uses a different cache syntax and gets plain text."""
+    if USE_BEDROCK:
+        return [SystemMessage(content=system), HumanMessage(content=f"{shared}\n\n{user}" if shared else user)]
+    cached = {"type": "ephemeral"}
+    human = [{"type": "text", "text": user}]
+    if shared:
+        human.insert(0, {"type": "text", "text": shared, "cache_control": cached})
+    return [SystemMessage(content=[{"type": "text", "text": system, "cache_control": cached}]), HumanMessage(content=human)]
+
+
+async def _invoke_persisted(runnable, schema: type[BaseModel], system: str, user: str, shared: str, key: str) -> Any:
+    """Return the on-disk result for this prompt if present, otherwise call the LLM and store it."""
+    if _llm_cache and (data := await asyncio.to_thread(_llm_cache.get, key)) is not None:
+        try:
+            return schema.model_validate_json(data)
+        except ValueError as e:
+            log.warning("Ignoring unreadable cached %s %s: %s", schema.__name__, key, e)
+    result = await runnable.ainvoke(_prompt_messages(system, user, shared))
+    if result is None:
+        # Structured output comes back empty when the tool call is cut off (e.g. at max_tokens)
+        raise ValueError(f"LLM returned no {schema.__name__}")
+    if _llm_cache:
+        await asyncio.to_thread(_llm_cache.put, key, result.model_dump_json().encode())
+    return result
+
+
+async def cached_invoke(runnable, schema: type[BaseModel], system: str, user: str, cache: InvokeCache, shared: str = "") -> Any:
+    """Invoke a structured-output LLM, collapsing identical prompts within one generation and
+    reusing results persisted by earlier runs (LLM_CACHE_DIR).
+    Concurrent duplicates await the same in-flight task; failed calls are evicted so a retry hits the LLM."""
+    llm = get_llm()
+    model = getattr(llm, "model", None) or getattr(llm, "model_id", "")
+    key = hashlib.blake2b(f"{schema.__name__}\0{model}\0{system}\0{shared}\0{user}".encode(), digest_size=16).hexdigest()
+    task = cache.get(key)
+    if task is None:
+        task = cache[key] = asyncio.ensure_future(_invoke_persisted(runnable, schema, system, user, shared, key))
+    try:
+        return await task
+    except Exception:
+        if cache.get(key) is task:
+            del cache[key]
+        raise
@@ -1,10 +1,13 @@
-import json, logging, asyncio
-from fastapi import FastAPI
+import logging, asyncio, time
+from contextlib import asynccontextmanager
+import orjson
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from dotenv import load_dotenv
 load_dotenv()
 
+from app.llm import warm_up
 from app.models import GenerateRequest, RefineRequest
 from app.pipeline import build_pipeline, run_pipeline_streaming
 from app.nodes.refine import refine_docs
@@ -12,11 +15,31 @@ from app.nodes.refine import refine_docs
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S")
 log = logging.getLogger("agent")
 
-app = FastAPI(title="better-docs agent")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the LLM connection pool in the background so startup (and /health) isn't delayed
+    warmup = asyncio.create_task(warm_up())
+    yield
+    warmup.cancel()
+
+app = FastAPI(title="better-docs agent", lifespan=lifespan, default_response_class=ORJSONResponse)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
 pipeline = build_pipeline()
 
+SSE_DISCONNECT_POLL = 1.0  # seconds between client-disconnect checks while the queue is idle
+SSE_KEEPALIVE = 15.0  # idle proxies drop silent connections during long LLM calls
+SSE_COALESCE_WINDOW = 0.05  # progress events arriving within this window are written as one chunk
+
+# Queue marker standing in for the newest progress event (kept in a single slot, see generate_stream)
+_PROGRESS = object()
+
+
+def _sse_frame(item: dict) -> str:
+    data = orjson.dumps(item["data"], option=orjson.OPT_NON_STR_KEYS).decode()
+    return f"event: {item['event']}\ndata: {data}\n\n"
+
+
 @app.get("/health")
 async def health():
     return {"status": "ok", "service": "better-docs-agent"}
@@ -55,19 +78,32 @@ async def generate(req: GenerateRequest):
 
 
 @app.post("/generate/stream")
-async def generate_stream(req: GenerateRequest):
+async def generate_stream(req: GenerateRequest, request: Request):
     """SSE endpoint that streams progress events during doc generation."""
     log.info(f"POST /generate/stream -- repo_url={req.repo_url} doc_type={req.doc_type}")
 
-    # Queue for SSE events -- pipeline pushes, generator pops
+    # SSE events -- pipeline pushes, generator pops. Page, plan and terminal events are never dropped
+    # (the web app rebuilds docs from them if "done" never arrives) and are bounded by the page cap.
+    # Progress is superseded by each update, so only the newest is kept: it sits in one slot and at
+    # most one _PROGRESS marker is queued for it, however slow the client.
     queue: asyncio.Queue = asyncio.Queue()
+    latest_progress: dict | None = None
 
     def on_progress(step: str, progress: int, message: str):
-        queue.put_nowait({"event": "progress", "data": {"step": step, "progress": progress, "message": message}})
+        nonlocal latest_progress
+        if latest_progress is None:
+            queue.put_nowait(_PROGRESS)
+        latest_progress = {"event": "progress", "data": {"step": step, "progress": progress, "message": message}}
 
     def on_page(page_id: str, page_data: dict):
         queue.put_nowait({"event": "page", "data": {"page_id": page_id, "page": page_data}})
 
+    def take(item):
+        nonlocal latest_progress
+        if item is _PROGRESS:
+            item, latest_progress = latest_progress, None
+        return item
+
     async def run_and_finish():
         try:
             result = await asyncio.wait_for(
@@ -90,17 +126,40 @@ async def generate_stream(req: GenerateRequest):
     async def event_generator():
         # Start pipeline in background task
         task = asyncio.create_task(run_and_finish())
+        last_sent = time.monotonic()
         try:
             while True:
-                item = await queue.get()
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=SSE_DISCONNECT_POLL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        log.info("  Client disconnected, cancelling pipeline")
+                        break
+                    if time.monotonic() - last_sent >= SSE_KEEPALIVE:
+                        yield ":ping\n\n"
+                        last_sent = time.monotonic()
+                    continue
                 if item is None:
                     break
-                event = item["event"]
-                data = json.dumps(item["data"])
-                yield f"event: {event}\ndata: {data}\n\n"
-        except asyncio.CancelledError:
-            task.cancel()
-            raise
+                if item is _PROGRESS:
+                    # Let closely spaced updates accumulate; pages and the terminal event go out immediately
+                    await asyncio.sleep(SSE_COALESCE_WINDOW)
+                batch, finished = [take(item)], False
+                while not queue.empty():
+                    item = queue.get_nowait()
+                    if item is None:
+                        finished = True
+                        break
+                    batch.append(take(item))
+                yield "".join(map(_sse_frame, batch))
+                last_sent = time.monotonic()
+                if finished:
+                    break
+                # Hand control back to the loop so each chunk is flushed before the next is queued
+                await asyncio.sleep(0)
+        finally:
+            if not task.done():
+                task.cancel()
 
     return StreamingResponse(
         event_generator(),
@@ -117,7 +176,7 @@ async def generate_stream(req: GenerateRequest):
 async def refine(req: RefineRequest):
     log.info(f"POST /refine -- repo={req.repo_name} prompt={req.prompt[:80]}")
     try:
-        updated = await refine_docs(req.current_docs.model_dump(), req.prompt, req.repo_name)
+        updated = await refine_docs(req.current_docs.model_dump(exclude_none=True, exclude_unset=True), req.prompt, req.repo_name)
         log.info(f"  Refined successfully")
         return {"docs": updated}
     except Exception as e:
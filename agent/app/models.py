@@ -1,22 +1,49 @@
 from pydantic import BaseModel, Field
-from typing import Literal
+from typing import Annotated, Literal, Union
 
 
 # --- Doc content schemas ---
 
-class DocSection(BaseModel):
-    type: Literal["heading", "paragraph", "codeBlock", "endpoint", "cardGroup", "table", "list"]
-    content: str | None = None
+class HeadingSection(BaseModel):
+    type: Literal["heading"]
+    content: str = ""
+    level: int | None = None
+
+class ParagraphSection(BaseModel):
+    type: Literal["paragraph"]
+    content: str = ""
+
+class CodeBlockSection(BaseModel):
+    type: Literal["codeBlock"]
+    content: str = ""
     language: str | None = None
-    method: str | None = None
-    path: str | None = None
+
+class EndpointSection(BaseModel):
+    type: Literal["endpoint"]
+    method: str = "GET"
+    path: str = ""
     description: str | None = None
     params: list[dict] | None = None
     response: str | None = None
     body: dict | None = None
-    cards: list[dict] | None = None
-    items: list[str] | None = None
-    level: int | None = None
+
+class CardGroupSection(BaseModel):
+    type: Literal["cardGroup"]
+    cards: list[dict] = []
+
+class TableSection(BaseModel):
+    type: Literal["table"]
+    content: str = ""
+
+class ListSection(BaseModel):
+    type: Literal["list"]
+    items: list[str] = []
+
+# Discriminated on `type`: each section validates (and serializes) only its own fields
+DocSection = Annotated[
+    Union[HeadingSection, ParagraphSection, CodeBlockSection, EndpointSection, CardGroupSection, TableSection, ListSection],
+    Field(discriminator="type"),
+]
 
 class DocPage(BaseModel):
     title: str
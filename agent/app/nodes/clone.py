@@ -1,8 +1,57 @@
-import asyncio, tempfile, shutil, logging
+import asyncio, os, tempfile, shutil, logging
 from pathlib import Path
+from app.nodes.parse import SKIP_DIRS, BINARY_EXTS
 
 logger = logging.getLogger(__name__)
 
+CLONE_TIMEOUT = 120
+SHALLOW_ARGS = ("--depth", "1", "--single-branch", "--no-tags")
+
+# Non-cone sparse-checkout patterns: check out everything except what parse_repo would skip anyway,
+# so committed assets and vendored trees are never downloaded
+SPARSE_PATTERNS = (
+    "/*",
+    "!.*",
+    *(f"!{d}/" for d in sorted(SKIP_DIRS)),
+    *(f"!*{ext}" for ext in sorted(BINARY_EXTS)),
+)
+
+
+async def _git(*args: str) -> tuple[int, str]:
+    """Run a git command, returning (exit code, stderr). Kills the process if the caller is cancelled."""
+    proc = await asyncio.create_subprocess_exec(
+        "git", *args,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+        # Fail fast on private repos instead of hanging on a credential prompt until the timeout
+        env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+    )
+    try:
+        _, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        proc.kill()
+        raise
+    return proc.returncode, stderr.decode().strip() if stderr else ""
+
+
+async def _clone_into(url: str, dest: str) -> None:
+    # Blobless, sparse clone first: only blobs matching SPARSE_PATTERNS are fetched at checkout
+    code, err = await _git("clone", "--filter=blob:none", "--no-checkout", *SHALLOW_ARGS, url, dest)
+    if code == 0:
+        code, err = await _git("-C", dest, "sparse-checkout", "set", "--no-cone", *SPARSE_PATTERNS)
+        if code == 0:
+            code, err = await _git("-C", dest, "checkout")
+        if code == 0:
+            return
+    logger.warning("Sparse clone failed (exit %d), falling back to plain shallow clone: %s", code, err)
+    shutil.rmtree(dest, ignore_errors=True)
+    os.makedirs(dest)
+
+    code, err = await _git("clone", *SHALLOW_ARGS, url, dest)
+    if code != 0:
+        logger.error("git clone failed (exit %d): %s", code, err)
+        raise RuntimeError(f"Failed to clone repository: {err or 'unknown git error (exit 128)'}")
+
 
 async def clone_repo(repo_url: str, github_token: str | None = None) -> str:
     url = repo_url
@@ -11,26 +60,59 @@ async def clone_repo(repo_url: str, github_token: str | None = None) -> str:
     tmp = tempfile.mkdtemp(prefix="betterdocs_")
     logger.info("Cloning %s into %s", repo_url, tmp)
     try:
-        proc = await asyncio.create_subprocess_exec(
-            "git", "clone", "--depth", "1", url, tmp,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        _, stderr = await asyncio.wait_for(proc.communicate(), timeout=120)
+        await asyncio.wait_for(_clone_into(url, tmp), timeout=CLONE_TIMEOUT)
     except asyncio.TimeoutError:
-        proc.kill()
         shutil.rmtree(tmp, ignore_errors=True)
         raise RuntimeError("Clone timed out after 120 seconds. The repository may be too large or unreachable.")
-
-    if proc.returncode != 0:
-        err = stderr.decode().strip() if stderr else ""
-        logger.error("git clone failed (exit %d): %s", proc.returncode, err)
+    except Exception:
         shutil.rmtree(tmp, ignore_errors=True)
-        raise RuntimeError(f"Failed to clone repository: {err or 'unknown git error (exit 128)'}")
+        raise
 
     logger.info("Clone successful: %s", tmp)
     return tmp
 
 
+def _read_head(repo_path: str) -> str | None:
+    """Resolve HEAD from the files a fresh clone writes (HEAD, a loose ref or packed-refs)."""
+    git_dir = os.path.join(repo_path, ".git")
+    try:
+        with open(os.path.join(git_dir, "HEAD")) as fh:
+            head = fh.read().strip()
+        if not head.startswith("ref: "):
+            return head or None  # detached HEAD holds the SHA itself
+        ref = head[5:]
+        try:
+            with open(os.path.join(git_dir, ref)) as fh:
+                return fh.read().strip() or None
+        except FileNotFoundError:
+            with open(os.path.join(git_dir, "packed-refs")) as fh:
+                for line in fh:
+                    sha, _, name = line.rstrip("\n").partition(" ")
+                    if name == ref:
+                        return sha
+    except OSError:
+        pass
+    return None
+
+
+async def head_commit(repo_path: str) -> str | None:
+    """SHA of the checked-out commit, or None if git can't resolve HEAD.
+    Read from .git directly so the common case costs no extra git process."""
+    if sha := await asyncio.to_thread(_read_head, repo_path):
+        return sha
+    # Other ref storage (e.g. reftable) -- let git resolve it
+    proc = await asyncio.create_subprocess_exec(
+        "git", "-C", repo_path, "rev-parse", "HEAD",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        stdout, _ = await proc.communicate()
+    except asyncio.CancelledError:
+        proc.kill()
+        raise
+    return stdout.decode().strip() if proc.returncode == 0 else None
+
+
 def get_repo_name(repo_url: str) -> str:
     return repo_url.rstrip("/").split("/")[-1].replace(".git", "")
@@ -1,8 +1,11 @@
-import asyncio, logging
-from typing import Callable, Optional
-from langchain_core.messages import SystemMessage, HumanMessage
-from app.llm import get_llm
-from app.models import DocPlan, DocPage
+import asyncio, hashlib, logging, os, re
+from collections import Counter, OrderedDict, defaultdict
+from functools import lru_cache
+from typing import Any, Callable, Optional
+import orjson
+from pydantic import BaseModel
+from app.llm import InvokeCache, cached_invoke, get_llm
+from app.models import DocPlan, DocPage, NavGroup, PagePlan
 
 log = logging.getLogger("agent")
 
@@ -12,7 +15,7 @@ page_llm = llm.with_structured_output(DocPage)
 
 PLAN_PROMPT = """You are a documentation architect. Given a complete codebase structure, produce a documentation plan.
 
-You receive every file and symbol in the repo. Decide what documentation pages to create, and map each page to the specific files and symbols it should cover.
+You receive every file that defines symbols, plus entrypoints such as README/main/index files, grouped by directory ("dir/:" followed by its files; a file's full path is dir/name). Files with many symbols are summarized as kind counts plus their main top-level names. In very large trees the biggest directories list bare file names without symbols; beyond that, directories may be summarized as "dir/: (N files, M symbols)" (their subdirectories are still listed), deep subtrees may fold into "dir/... (N files, M symbols)", and a final "... (N more directories)" line counts directories left out. Decide what documentation pages to create, and map each page to the specific files and symbols it should cover. Always use full file paths in source_files.
 
 Rules:
 - Create between 4 and 9 pages MAXIMUM. Combine related topics into single pages rather than making many small ones.
@@ -35,84 +38,301 @@ Rules:
 
 PIPELINE_MAX_TIMEOUT = 600  # 10 min -- individual calls have no timeout; the pipeline enforces the cap
 
+# Concurrent page-generation calls; page work is network-bound so this tracks provider limits, not CPUs
+PAGE_CONCURRENCY = int(os.getenv("DOC_PAGE_CONCURRENCY", "12"))
+
+# Pages generated per repo; longer plans are trimmed
+MAX_PAGES = 9
+
+# Repos with fewer files than this get a heuristic plan instead of a planning LLM call
+PLAN_MIN_FILES = int(os.getenv("LLM_PLAN_MIN_FILES", "9"))
+
+# Output ceiling per page call, scaled with the code the page covers. Anthropic's output-token rate
+# limit reserves max_tokens up front, so tighter ceilings mean less throttling at high concurrency.
+_PAGE_BASE_TOKENS = 3072
+_PAGE_TOKENS_PER_SOURCE = 256
+_TOKENS_BUCKET = 1024
+
+# Transient API errors (429/5xx, timeouts) are already retried with backoff by the SDK (LLM_MAX_RETRIES),
+# so they fail fast here. Malformed or truncated structured output gets one immediate repair round.
+_REPAIR_NOTE = "\n\nYour previous response did not match the required schema or was cut off. Return the COMPLETE result in the required structure."
+_failure_stats: Counter = Counter()
+
+# Generate an "overview" page from top-level files while the planning call is in flight and reuse it
+# if the plan has an overview page (saves one round trip on the critical path, costs a call on a miss)
+SPECULATIVE_OVERVIEW = os.getenv("DOC_SPECULATIVE_OVERVIEW", "0").lower() in ("1", "true", "yes")
+_speculation_stats: Counter = Counter()
+
+
+# --- Per-process caches (repeat generations of an unchanged repo skip the formatting work) ---
+
+_CACHE_MAX_ENTRIES = 64
+_file_tree_cache: OrderedDict[bytes, str] = OrderedDict()
+_page_context_cache: OrderedDict[tuple, str] = OrderedDict()
+
+
+def _structure_digest(structure: list[dict]) -> bytes:
+    return hashlib.blake2b(orjson.dumps(structure, option=orjson.OPT_SORT_KEYS), digest_size=16).digest()
+
+
+def _cache_get(cache: OrderedDict, key) -> str | None:
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def _cache_put(cache: OrderedDict, key, value: str) -> str:
+    cache[key] = value
+    if len(cache) > _CACHE_MAX_ENTRIES:
+        cache.popitem(last=False)
+    return value
+
+
+_FILE_TREE_MAX_CHARS = 60000
+_FOLD_SYMBOLS_OVER = 5  # files with more symbols are summarized as kind counts + a few top-level names
+_FOLD_TOP_NAMES = 3
+
+
+def _is_private(s: dict) -> bool:
+    return s.get("name", "").startswith("_") or "private" in (s.get("vis") or "")
+
+
+def _file_tree_line(name: str, f: dict) -> str:
+    lang = f.get("language", "")
+    symbols = f.get("symbols", [])
+    if not symbols:
+        return f"  {name} ({lang})"
+    if len(symbols) <= _FOLD_SYMBOLS_OVER:
+        return f"  {name} ({lang}) [{', '.join(s.get('kind', '') + ':' + s.get('name', '') for s in symbols)}]"
+    counts = Counter(s.get("kind", "") for s in symbols)
+    top = [s.get("name", "") for s in symbols if not s.get("parent") and not _is_private(s)][:_FOLD_TOP_NAMES]
+    kinds = " ".join(f"{kind}={n}" for kind, n in counts.most_common())
+    return f"  {name} ({lang}) {{{kinds} top=[{', '.join(top)}]}}"
+
+
+# One rendered directory: (dir, "dir/:\n" + its file lines, file count, symbol count)
+TreeGroup = tuple[str, str, int, int]
+
+
+def _folded_prefix(d: str, folded: set[str]) -> str | None:
+    """Shortest folded ancestor-or-self of directory d, if any."""
+    if not d or not folded:
+        return None
+    parts = d.split("/")
+    for i in range(1, len(parts) + 1):
+        prefix = "/".join(parts[:i])
+        if prefix in folded:
+            return prefix
+    return None
+
+
+def _fold_line(prefix: str, n_files: int, n_symbols: int) -> str:
+    return f"{prefix}/... ({n_files} files, {n_symbols} symbols)"
+
+
+def _render_pieces(groups: list[TreeGroup], folded: set[str]) -> list[tuple[str, str]]:
+    """(owning dir, text) per directory block; groups under a folded prefix collapse into one fold line."""
+    pieces: list[tuple[str, str]] = []
+    counts: dict[str, list[int]] = {}
+    for d, text, n_files, n_symbols in groups:
+        key = _folded_prefix(d, folded)
+        if key is None:
+            pieces.append((d, text))
+            continue
+        if key not in counts:
+            counts[key] = [0, 0, len(pieces)]
+            pieces.append((key, ""))
+        counts[key][0] += n_files
+        counts[key][1] += n_symbols
+    for key, (n_files, n_symbols, idx) in counts.items():
+        pieces[idx] = (key, _fold_line(key, n_files, n_symbols))
+    return pieces
+
+
+def _shrink_groups(groups: list[TreeGroup], size: int, shorter: Callable[[TreeGroup], str]) -> int:
+    """Swap group texts for shorter(group), largest first, until the tree fits; returns the new size."""
+    for i in sorted(range(len(groups)), key=lambda i: len(groups[i][1]), reverse=True):
+        if size <= _FILE_TREE_MAX_CHARS:
+            break
+        d, text, n_files, n_symbols = groups[i]
+        short = shorter(groups[i])
+        if len(short) < len(text):
+            groups[i] = (d, short, n_files, n_symbols)
+            size -= len(text) - len(short)
+    return size
+
 
 def _build_file_tree(structure: list[dict]) -> str:
-    lines = []
+    """Directory-grouped file tree for the planning prompt, capped at _FILE_TREE_MAX_CHARS.
+    Oversized trees shrink in steps, largest directories first and only until the tree fits: symbol
+    lists are dropped (bare file names stay, so every path is still visible), then directories are
+    summarized to one line, then whole subtrees fold, deepest level first. Whatever still does not fit
+    is cut at a directory boundary with a "... (N more directories)" line.
+    Each directory's text is rendered once; later passes only reassemble the cached strings."""
+    by_dir: dict[str, list[tuple[str, dict]]] = defaultdict(list)
     for f in structure:
-        path = f.get("path", "")
-        lang = f.get("language", "")
-        symbols = f.get("symbols", [])
-        if not symbols:
-            lines.append(f"{path} ({lang})")
-        else:
-            sym_parts = [f"{s.get('kind', '')}:{s.get('name', '')}" for s in symbols]
-            lines.append(f"{path} ({lang}) [{', '.join(sym_parts)}]")
-    return "\n".join(lines)
+        d, _, name = f.get("path", "").rpartition("/")
+        by_dir[d].append((name, f))
+    groups: list[TreeGroup] = []
+    for d in sorted(by_dir, key=lambda d: d.split("/")):
+        files = sorted(by_dir[d], key=lambda x: x[0])
+        text = "\n".join([f"{d or '.'}/:", *(_file_tree_line(name, f) for name, f in files)])
+        groups.append((d, text, len(files), sum(len(f.get("symbols", [])) for _, f in files)))
+
+    size = sum(len(text) + 1 for _, text, _, _ in groups) - 1
+    size = _shrink_groups(groups, size, lambda g: "\n".join(
+        [f"{g[0] or '.'}/:", *(f"  {name}" for name, _ in sorted(by_dir[g[0]], key=lambda x: x[0]))]))
+    size = _shrink_groups(groups, size, lambda g: f"{g[0] or '.'}/: ({g[2]} files, {g[3]} symbols)")
+
+    folded: set[str] = set()
+    pieces = _render_pieces(groups, folded)
+    depth = max((d.count("/") + 1 for d in by_dir if d), default=0)
+    while size > _FILE_TREE_MAX_CHARS and depth > 0:
+        current: dict[str, int] = defaultdict(int)
+        for owner, text in pieces:
+            if owner and owner.count("/") + 1 >= depth:
+                current["/".join(owner.split("/")[:depth])] += len(text) + 1
+        totals: dict[str, list[int]] = defaultdict(lambda: [0, 0])
+        for d, _, n_files, n_symbols in groups:
+            if d and d.count("/") + 1 >= depth:
+                t = totals["/".join(d.split("/")[:depth])]
+                t[0] += n_files
+                t[1] += n_symbols
+        for prefix in sorted(current, key=current.__getitem__, reverse=True):
+            saved = current[prefix] - len(_fold_line(prefix, *totals[prefix])) - 1
+            if saved <= 0:
+                continue
+            folded.add(prefix)
+            size -= saved
+            if size <= _FILE_TREE_MAX_CHARS:
+                break
+        pieces = _render_pieces(groups, folded)
+        size = sum(len(text) + 1 for _, text in pieces) - 1
+        depth -= 1
+
+    if size > _FILE_TREE_MAX_CHARS:
+        # Too many top-level directories to fit even fully folded: keep what fits and count the rest
+        budget = _FILE_TREE_MAX_CHARS - 40
+        for kept, (_, text) in enumerate(pieces):
+            budget -= len(text) + 1
+            if budget < 0:
+                break
+        pieces = [*pieces[:kept], ("", f"... ({len(pieces) - kept} more directories)")]
+    return "\n".join(text for _, text in pieces)
 
 
 _SYMBOLS_BUDGET = 12000
 
+_DOC_MAX_CHARS = 300
+
+
+def _short_doc(doc: str, n: int = _DOC_MAX_CHARS) -> str:
+    """First paragraph of a docstring, capped at n chars -- long module docs otherwise dominate the prompt."""
+    first = doc.split("\n\n", 1)[0]
+    return first[:n] + ("…" if len(first) > n else "")
+
 
 def _format_symbol(s: dict) -> str:
-    name = s.get("name", "")
-    kind = s.get("kind", "")
-    entry = f"  {kind} {name}"
+    parts = [f"  {s.get('kind', '')} {s.get('name', '')}"]
     if s.get("parent"):
-        entry += f" (in {s['parent']})"
+        parts.append(f" (in {s['parent']})")
     if s.get("vis"):
-        entry += f" [{s['vis']}]"
+        parts.append(f" [{s['vis']}]")
     if s.get("sig"):
-        entry += f"\n    signature: {s['sig']}"
+        parts.append(f"\n    signature: {s['sig']}")
     if s.get("decos"):
-        entry += f"\n    decorators: {s['decos']}"
+        parts.append(f"\n    decorators: {s['decos']}")
     if s.get("params"):
-        entry += f"\n    params: {s['params']}"
+        parts.append(f"\n    params: {s['params']}")
     if s.get("ret"):
-        entry += f"\n    returns: {s['ret']}"
+        parts.append(f"\n    returns: {s['ret']}")
     if s.get("doc"):
-        entry += f"\n    docstring: {s['doc']}"
-    return entry
+        parts.append(f"\n    docstring: {_short_doc(s['doc'])}")
+    return "".join(parts)
 
 
 def _format_file_block(path: str, symbols: list[dict]) -> str:
-    lines = [f"# {path}"]
-    for s in symbols:
-        lines.append(_format_symbol(s))
-    return "\n".join(lines)
-
-
-def _get_symbols_for_page(page_plan: dict, structure: list[dict], budget: int = _SYMBOLS_BUDGET) -> str:
-    """Extract full symbol details for files relevant to a page, within a character budget."""
-    source_files = set(page_plan.get("source_files", []))
-    source_symbols = set(page_plan.get("source_symbols", []))
+    return "\n".join([f"# {path}", *map(_format_symbol, symbols)])
 
-    priority_blocks: list[str] = []
-    normal_blocks: list[str] = []
 
+def _index_structure(structure: list[dict]) -> tuple[dict[str, dict], dict[str, list[tuple[str, dict]]]]:
+    """Build path -> file and symbol name -> [(path, symbol)] lookups once per generation."""
+    by_path: dict[str, dict] = {}
+    by_symbol: dict[str, list[tuple[str, dict]]] = defaultdict(list)
     for f in structure:
         path = f.get("path", "")
-        if path not in source_files:
-            continue
-        normal_blocks.append(_format_file_block(path, f.get("symbols", [])))
+        by_path[path] = f
+        for s in f.get("symbols", []):
+            by_symbol[s.get("name", "")].append((path, s))
+    return by_path, by_symbol
 
-    if source_symbols:
-        for f in structure:
-            path = f.get("path", "")
-            if path in source_files:
-                continue
-            for s in f.get("symbols", []):
-                if s.get("name", "") in source_symbols:
-                    priority_blocks.append(f"# {path}\n{_format_symbol(s)}")
+
+# Formatted context blocks memoized across the pages of one generation, with their budget cost
+# (len + separator). Keys: path (whole file), ("public", path), ("sym", name, i).
+BlockCache = dict[object, tuple[str, int]]
+
+
+def _memo_block(blocks: BlockCache, key: object, build: Callable[[], str]) -> tuple[str, int]:
+    entry = blocks.get(key)
+    if entry is None:
+        text = build()
+        entry = blocks[key] = (text, len(text) + 2)
+    return entry
+
+
+def _min_block_cost(path: str, symbols: list[dict]) -> int:
+    """Lower bound on the cost of a file's smallest (public-only) block: header plus `kind name` lines."""
+    return len(path) + 4 + sum(len(s.get("kind", "")) + len(s.get("name", "")) + 4 for s in symbols if not _is_private(s))
+
+
+def _get_symbols_for_page(
+    page_plan: dict,
+    by_path: dict[str, dict],
+    by_symbol: dict[str, list[tuple[str, dict]]],
+    blocks: BlockCache,
+    budget: int = _SYMBOLS_BUDGET,
+) -> str:
+    """Extract full symbol details for files relevant to a page, within a character budget."""
+    source_files = [p for p in dict.fromkeys(page_plan.get("source_files", [])) if p in by_path]
+    source_symbols = dict.fromkeys(page_plan.get("source_symbols", []))
 
     selected: list[str] = []
     used = 0
     omitted = 0
 
-    for block in priority_blocks + normal_blocks:
-        cost = len(block) + 2
-        if used + cost > budget and selected:
+    # Blocks are built lazily: once a cheap lower bound on a block's cost no longer fits,
+    # it is counted as omitted without being formatted
+    if source_symbols:
+        covered = set(source_files)
+        for name in source_symbols:
+            for i, (path, s) in enumerate(by_symbol.get(name, ())):
+                if path in covered:
+                    continue
+                if selected and used + len(path) + len(s.get("kind", "")) + len(name) + 8 > budget:
+                    omitted += 1
+                    continue
+                block, cost = _memo_block(blocks, ("sym", name, i), lambda: f"# {path}\n{_format_symbol(s)}")
+                if used + cost > budget and selected:
+                    omitted += 1
+                    continue
+                selected.append(block)
+                used += cost
+
+    # Pages overlap heavily in source_files; each file is formatted once per generation
+    for path in source_files:
+        symbols = by_path[path].get("symbols", [])
+        if selected and used + _min_block_cost(path, symbols) > budget:
             omitted += 1
             continue
+        block, cost = _memo_block(blocks, path, lambda: _format_file_block(path, symbols))
+        if used + cost > budget and selected:
+            # Over budget: drop the file's private symbols before dropping the whole file
+            public = [s for s in symbols if not _is_private(s)]
+            block, cost = _memo_block(blocks, ("public", path), lambda: _format_file_block(path, public))
+            if not public or used + cost > budget:
+                omitted += 1
+                continue
         selected.append(block)
         used += cost
 
@@ -122,33 +342,141 @@ def _get_symbols_for_page(page_plan: dict, structure: list[dict], budget: int =
     return "\n\n".join(selected) if selected else "No specific symbols found."
 
 
-async def _plan_docs(structure: list[dict], doc_type: str, repo_name: str, readme: str) -> DocPlan:
-    file_tree = _build_file_tree(structure)
+# Symbol-less files (configs, .d.ts stubs, assets) only add noise to the plan prompt unless they are entrypoints
+_ENTRYPOINT_RE = re.compile(r"(^|/)(README|main|index|__init__|mod)\.", re.IGNORECASE)
+
+
+def _plan_files(structure: list[dict]) -> list[dict]:
+    return [f for f in structure if f.get("symbols") or _ENTRYPOINT_RE.search(f.get("path", ""))]
+
+
+def _cached_file_tree(structure: list[dict], digest: bytes) -> str:
+    return _cache_get(_file_tree_cache, digest) or _cache_put(_file_tree_cache, digest, _build_file_tree(_plan_files(structure)))
+
+
+def _cached_symbols_for_page(
+    page_plan: dict,
+    digest: bytes,
+    by_path: dict[str, dict],
+    by_symbol: dict[str, list[tuple[str, dict]]],
+    blocks: BlockCache,
+) -> str:
+    key = (digest, tuple(page_plan.get("source_files", [])), tuple(page_plan.get("source_symbols", [])))
+    return _cache_get(_page_context_cache, key) or _cache_put(
+        _page_context_cache, key, _get_symbols_for_page(page_plan, by_path, by_symbol, blocks)
+    )
+
+
+def _page_slug(path: str) -> str:
+    stem = path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+    return re.sub(r"[^a-z0-9]+", "-", stem.lower()).strip("-") or "module"
+
+
+def _overview_page(repo_name: str, source_files: list[str]) -> PagePlan:
+    return PagePlan(
+        title=repo_name,
+        description=f"What {repo_name} is, how it is organized and how its pieces fit together",
+        source_files=source_files,
+    )
+
+
+def _heuristic_plan(structure: list[dict], doc_type: str, repo_name: str) -> DocPlan:
+    """Plan for small repos: an overview, a getting-started page and one reference page per file.
+    If that would exceed MAX_PAGES, the files that don't get a page of their own share the last one."""
+    all_files = [f.get("path", "") for f in structure]
+    pages = {
+        "overview": _overview_page(repo_name, all_files),
+        "getting-started": PagePlan(
+            title="Getting Started",
+            description=f"Installing {repo_name} and a first end-to-end usage example",
+            source_files=all_files,
+        ),
+    }
+    reference: list[str] = []
+    with_symbols = [f.get("path", "") for f in structure if f.get("symbols")]
+    slots = MAX_PAGES - len(pages)
+    own, rest = (with_symbols, []) if len(with_symbols) <= slots else (with_symbols[:slots - 1], with_symbols[slots - 1:])
+    for path in own:
+        slug = base = _page_slug(path)
+        n = 2
+        while slug in pages:
+            slug, n = f"{base}-{n}", n + 1
+        pages[slug] = PagePlan(title=path.rsplit("/", 1)[-1], description=f"Reference for {path}", source_files=[path])
+        reference.append(slug)
+    if rest:
+        slug = "other-modules" if "other-modules" not in pages else "other-modules-ref"
+        pages[slug] = PagePlan(title="Other Modules", description=f"Reference for {', '.join(rest)}", source_files=rest)
+        reference.append(slug)
+
+    navigation = [NavGroup(group="Getting Started", pages=["overview", "getting-started"])]
+    if reference:
+        navigation.append(NavGroup(group="Reference", pages=reference))
+    return DocPlan(title=repo_name, description=f"{doc_type} documentation for {repo_name}", navigation=navigation, pages=pages)
+
+
+async def _plan_docs(structure: list[dict], doc_type: str, repo_name: str, readme: str, digest: bytes) -> DocPlan:
+    file_tree = _cached_file_tree(structure, digest)
     user_msg = f"""Plan {doc_type} documentation for "{repo_name}" ({len(structure)} files).
 
 README:
 {readme[:4000] if readme else "No README."}
 
-Complete file tree with symbols:
+File tree with symbols:
 {file_tree}"""
 
-    return await plan_llm.ainvoke([SystemMessage(content=PLAN_PROMPT), HumanMessage(content=user_msg)])
+    return await cached_invoke(plan_llm, DocPlan, PLAN_PROMPT, user_msg, {})
 
 
+def _page_max_tokens(page_plan: dict) -> int:
+    n = max(len(page_plan.get("source_files", [])), len(page_plan.get("source_symbols", [])))
+    want = _PAGE_BASE_TOKENS + n * _PAGE_TOKENS_PER_SOURCE
+    return min(llm.max_tokens, -(-want // _TOKENS_BUCKET) * _TOKENS_BUCKET)
 
-async def _generate_page(page_id: str, page_plan: dict, structure: list[dict], doc_type: str, repo_name: str, readme: str) -> tuple[str, dict]:
-    symbols_context = _get_symbols_for_page(page_plan, structure)
-    user_msg = f"""Generate the "{page_plan.get('title', page_id)}" page for {doc_type} docs of "{repo_name}".
 
-Page purpose: {page_plan.get('description', '')}
+@lru_cache(maxsize=None)
+def _bounded_llm(schema: type[BaseModel], max_tokens: int):
+    """Structured-output runnable with a lower max_tokens (the copy shares the client's connection pool)."""
+    return llm.model_copy(update={"max_tokens": max_tokens}).with_structured_output(schema)
 
-Relevant code:
-{symbols_context}
+
+async def _invoke_page_llm(
+    runnable, schema: type[BaseModel], max_tokens: int, system: str, user: str, cache: InvokeCache, shared: str
+) -> Any:
+    first = _bounded_llm(schema, max_tokens) if max_tokens < llm.max_tokens else runnable
+    try:
+        return await cached_invoke(first, schema, system, user, cache, shared)
+    except ValueError as e:
+        # Pydantic/output-parser errors and empty results: the same prompt would fail the same way
+        _failure_stats["malformed"] += 1
+        log.warning("%s output malformed at max_tokens=%d, repairing at %d (failures so far: %s): %s",
+                    schema.__name__, max_tokens, llm.max_tokens, dict(_failure_stats), e)
+        return await cached_invoke(runnable, schema, system, user + _REPAIR_NOTE, cache, shared)
+    except Exception:
+        _failure_stats["api"] += 1
+        raise
+
+
+# Page calls only need the README's framing; the planning call sees the first 4000 chars
+_README_EXCERPT_CHARS = 800
+
+
+def _shared_page_context(doc_type: str, repo_name: str, readme: str) -> str:
+    """Prompt prefix common to every page of one generation (the cacheable part)."""
+    return f"""You are writing {doc_type} docs for "{repo_name}".
 
 README excerpt (for context):
-{readme[:1500] if readme else "N/A"}"""
+{readme[:_README_EXCERPT_CHARS] if readme else "N/A"}"""
+
+
+async def _generate_page(page_id: str, page_plan: dict, symbols_context: str, shared: str, cache: InvokeCache) -> tuple[str, dict]:
+    user_msg = f"""Generate the "{page_plan.get('title', page_id)}" page.
+
+Page purpose: {page_plan.get('description', '')}
+
+Relevant code:
+{symbols_context}"""
 
-    result: DocPage = await page_llm.ainvoke([SystemMessage(content=PAGE_PROMPT), HumanMessage(content=user_msg)])
+    result: DocPage = await _invoke_page_llm(page_llm, DocPage, _page_max_tokens(page_plan), PAGE_PROMPT, user_msg, cache, shared)
     return page_id, result.model_dump(exclude_none=True)
 
 
@@ -170,13 +498,36 @@ async def generate_docs(
 
     if on_progress:
         on_progress("generate", 40, "Planning documentation structure...")
-    plan = await _plan_docs(structure, doc_type, repo_name, readme_content)
+    digest = _structure_digest(structure)
+    by_path, by_symbol = _index_structure(structure)
+    blocks: BlockCache = {}
+    cache: InvokeCache = {}
+    shared = _shared_page_context(doc_type, repo_name, readme_content)
+
+    speculative: asyncio.Task | None = None
+    if len(structure) < PLAN_MIN_FILES:
+        log.info("Small repo (%d files), using heuristic plan", len(structure))
+        plan = _heuristic_plan(structure, doc_type, repo_name)
+    else:
+        if SPECULATIVE_OVERVIEW:
+            top_level = [p for p in by_path if p.count("/") <= 1]
+            overview = _overview_page(repo_name, top_level).model_dump()
+            speculative = asyncio.ensure_future(_generate_page(
+                "overview", overview, _get_symbols_for_page(overview, by_path, by_symbol, blocks), shared, cache,
+            ))
+        try:
+            plan = await _plan_docs(structure, doc_type, repo_name, readme_content, digest)
+        except BaseException:
+            if speculative:
+                speculative.cancel()
+            raise
 
     pages_plan = plan.pages
     if not pages_plan:
+        if speculative:
+            speculative.cancel()
         return plan.model_dump()
 
-    MAX_PAGES = 9
     if len(pages_plan) > MAX_PAGES:
         trimmed_ids = list(pages_plan.keys())[:MAX_PAGES]
         pages_plan = {k: pages_plan[k] for k in trimmed_ids}
@@ -197,38 +548,68 @@ async def generate_docs(
             "navigation": [g.model_dump() for g in plan.navigation],
         })
 
-    sem = asyncio.Semaphore(5)
-    completed = {"count": 0}
+    plans = {
+        page_id: pp.model_dump() if hasattr(pp, "model_dump") else pp
+        for page_id, pp in pages_plan.items()
+    }
+    if speculative:
+        _speculation_stats["hit" if "overview" in plans else "miss"] += 1
+        log.info("Speculative overview %s (hits %d/%d)", "reused" if "overview" in plans else "discarded",
+                 _speculation_stats["hit"], sum(_speculation_stats.values()))
+        if "overview" not in plans:
+            speculative.cancel()
+            speculative = None
+    contexts = {
+        page_id: _cached_symbols_for_page(pp, digest, by_path, by_symbol, blocks)
+        for page_id, pp in plans.items()
+        if not (speculative and page_id == "overview")
+    }
+
+    sem = asyncio.Semaphore(PAGE_CONCURRENCY)
 
-    async def _generate_page_limited(page_id: str, pp: dict) -> tuple[str, dict]:
+    async def _generate_page_limited(page_id: str) -> tuple[str, dict]:
         async with sem:
             try:
-                result = await _generate_page(page_id, pp, structure, doc_type, repo_name, readme_content)
+                return await _generate_page(page_id, plans[page_id], contexts[page_id], shared, cache)
             except Exception as e:
-                log.error("Page '%s' FAILED: %s", page_id, e)
+                log.error("Page %s FAILED: %s", page_id, e)
                 raise
-            completed["count"] += 1
+
+    async def _speculative_overview() -> tuple[str, dict]:
+        try:
+            return await speculative
+        except Exception as e:
+            log.warning("Speculative overview failed, generating from plan: %s", e)
+            contexts["overview"] = _cached_symbols_for_page(plans["overview"], digest, by_path, by_symbol, blocks)
+            return await _generate_page_limited("overview")
+
+    # Explicit tasks so they can be cancelled: as_completed leaves its jobs running if the consumer goes away
+    jobs = [asyncio.ensure_future(_generate_page_limited(page_id)) for page_id in contexts]
+    if speculative:
+        jobs.append(asyncio.ensure_future(_speculative_overview()))
+
+    # Report each page the moment it lands rather than after the slowest one
+    generated: dict[str, dict] = {}
+    try:
+        for next_page in asyncio.as_completed(jobs):
+            try:
+                page_id, page_data = await next_page
+            except Exception:
+                continue
+            generated[page_id] = page_data
             if on_progress:
-                pct = 42 + int((completed["count"] / total_pages) * 55)
-                on_progress("generate", pct, f"Generated page {completed['count']}/{total_pages}: {pp.get('title', page_id)}")
+                pct = 42 + int((len(generated) / total_pages) * 55)
+                on_progress("generate", pct, f"Generated page {len(generated)}/{total_pages}: {plans[page_id].get('title', page_id)}")
             if on_page:
-                on_page(result[0], result[1])
-            return result
-
-    tasks = [
-        _generate_page_limited(page_id, pp.model_dump() if hasattr(pp, "model_dump") else pp)
-        for page_id, pp in pages_plan.items()
-    ]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    pages = {}
-    failed_count = 0
-    for result in results:
-        if isinstance(result, Exception):
-            failed_count += 1
-            continue
-        page_id, page_data = result
-        pages[page_id] = page_data
+                on_page(page_id, page_data)
+    finally:
+        # Client disconnect or the pipeline timeout: stop in-flight page calls instead of letting them bill
+        for job in jobs:
+            job.cancel()
+
+    # Keep pages in plan order regardless of which call finished first
+    pages = {pid: generated[pid] for pid in plans if pid in generated}
+    failed_count = total_pages - len(pages)
 
     if on_progress:
         msg = f"Assembling final documentation... ({len(pages)}/{total_pages} pages succeeded"
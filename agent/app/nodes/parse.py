@@ -1,5 +1,5 @@
-import asyncio, httpx, os, logging
-from pathlib import Path
+import asyncio, gzip, httpx, orjson, os, logging
+from typing import Iterator
 
 ENGINE_URL = os.getenv("ENGINE_URL", "http://localhost:3001")
 log = logging.getLogger("agent")
@@ -24,81 +24,157 @@ BINARY_EXTS = {
 }
 
 
-def _is_text_file(path: Path) -> bool:
-    """Quick check: skip known binary extensions, then verify the file is readable as text."""
-    if path.suffix.lower() in BINARY_EXTS:
-        return False
-    if path.name in (".DS_Store", "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "Cargo.lock"):
-        return False
-    try:
-        with open(path, "rb") as f:
-            chunk = f.read(8192)
-        if b"\x00" in chunk:
-            return False
-    except Exception:
-        return False
-    return True
-
-
-def _collect_files(repo_path: str) -> list[tuple[str, str]]:
-    """Collect all text files in the repo (called via asyncio.to_thread)."""
-    root = Path(repo_path)
-    files = []
-    for path in root.rglob("*"):
-        if not path.is_file():
-            continue
-        rel = str(path.relative_to(root))
-        if any(part.startswith(".") or part in SKIP_DIRS for part in rel.split("/")):
-            continue
-        if path.stat().st_size > MAX_FILE_SIZE:
-            continue
-        if not _is_text_file(path):
-            continue
+SKIP_FILES = {".DS_Store", "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "Cargo.lock"}
+
+
+def _walk_files(repo_path: str) -> Iterator[tuple[str, os.DirEntry]]:
+    """Yield (relative path, entry) for regular files. Hidden and SKIP_DIRS directories are
+    pruned before descending, so node_modules/.git/vendor trees are never stat'ed."""
+    stack = [("", repo_path)]
+    while stack:
+        prefix, dirpath = stack.pop()
         try:
-            content = path.read_text(errors="replace")
-        except Exception:
+            with os.scandir(dirpath) as it:
+                entries = list(it)
+        except OSError:
             continue
-        files.append((rel, content))
-    return files
-
-
-async def parse_repo(repo_path: str, repo_name: str) -> dict:
-    """Walk the cloned repo and send all parseable files to the engine concurrently."""
-    files_to_parse = await asyncio.to_thread(_collect_files, repo_path)
-
-    sem = asyncio.Semaphore(20)
-    total_symbols = 0
-    files_sent = 0
-    files_failed = 0
-    lock = asyncio.Lock()
-
-    async def _send(rel: str, content: str):
-        nonlocal total_symbols, files_sent, files_failed
-        async with sem:
-            try:
-                r = await _client.post("/parse", json={
-                    "filename": rel,
-                    "content": content,
-                    "repo_name": repo_name,
-                })
-                data = r.json()
-                symbols = len(data.get("parsing", {}).get("symbols", []))
-                async with lock:
-                    total_symbols += symbols
-                    files_sent += 1
-            except Exception as e:
-                log.warning("Failed to parse %s: %s", rel, e)
-                async with lock:
-                    files_failed += 1
-
-    await asyncio.gather(*[_send(rel, content) for rel, content in files_to_parse])
+        for e in entries:
+            name = e.name
+            if name.startswith("."):
+                continue
+            if e.is_dir(follow_symlinks=False):
+                if name not in SKIP_DIRS:
+                    stack.append((f"{prefix}{name}/", e.path))
+            elif e.is_file(follow_symlinks=False):
+                yield prefix + name, e
+
+
+def _is_candidate(name: str) -> bool:
+    return name not in SKIP_FILES and os.path.splitext(name)[1].lower() not in BINARY_EXTS
+
+
+def _read_text_file(path: str) -> str | None:
+    """Read a file if it is small enough and not binary (NUL byte in the first 8 KiB)."""
+    try:
+        with open(path, "rb") as fh:
+            if os.fstat(fh.fileno()).st_size > MAX_FILE_SIZE:
+                return None
+            raw = fh.read()
+    except OSError:
+        return None
+    if b"\x00" in raw[:8192]:
+        return None
+    return raw.decode("utf-8", errors="replace")
+
+
+def list_repo_files(repo_path: str) -> list[str]:
+    """Cheap listing of candidate source paths (no reads)."""
+    return [rel for rel, e in _walk_files(repo_path) if _is_candidate(e.name)]
+
+
+READ_BATCH = 16
+# Files are posted to /parse_batch in groups, amortizing per-request overhead on small files
+BATCH_MAX_FILES = 32
+BATCH_MAX_BYTES = 2_000_000
+SEND_CONCURRENCY = 8
+# Source text compresses several-fold; below this size framing dominates and it's sent as-is
+COMPRESS_MIN_BYTES = 4096
+# A batch parses up to BATCH_MAX_FILES files and ingests each into the graph, so it gets far longer
+# than the client default sized for single-file requests; a timeout fails the whole batch
+BATCH_TIMEOUT = httpx.Timeout(30, read=float(os.getenv("PARSE_BATCH_TIMEOUT", "180")))
+
+
+def _encode_batch(repo_name: str, batch: list[dict]) -> tuple[bytes, dict]:
+    """Serialize a /parse_batch body, gzip-compressing it when large enough to pay off."""
+    body = orjson.dumps({"repo_name": repo_name, "files": batch})
+    headers = {"Content-Type": "application/json"}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=1)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+def _read_batch(repo_path: str, rel_paths: list[str]) -> list[tuple[str, str]]:
+    """Read a slice of candidate files (called via asyncio.to_thread)."""
+    out = []
+    for rel in rel_paths:
+        content = _read_text_file(os.path.join(repo_path, rel))
+        if content is not None:
+            out.append((rel, content))
+    return out
+
+
+async def parse_repo(repo_path: str, repo_name: str, rel_paths: list[str] | None = None) -> dict:
+    """Send all parseable files of the cloned repo to the engine concurrently.
+    rel_paths is the list_repo_files() listing if the caller already has one; otherwise the repo is walked here.
+    Reads run in a worker thread while senders drain a bounded queue of batches, so disk and
+    network I/O overlap and only a few batches of file contents are held at once."""
+    if rel_paths is None:
+        rel_paths = await asyncio.to_thread(list_repo_files, repo_path)
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_CONCURRENCY)
+    file_paths = []
+
+    async def _produce():
+        batch, batch_bytes = [], 0
+        try:
+            for i in range(0, len(rel_paths), READ_BATCH):
+                for rel, content in await asyncio.to_thread(_read_batch, repo_path, rel_paths[i:i + READ_BATCH]):
+                    if batch and (len(batch) >= BATCH_MAX_FILES or batch_bytes + len(content) > BATCH_MAX_BYTES):
+                        await queue.put(batch)
+                        batch, batch_bytes = [], 0
+                    file_paths.append(rel)
+                    batch.append({"filename": rel, "content": content})
+                    batch_bytes += len(content)
+            if batch:
+                await queue.put(batch)
+        finally:
+            for _ in range(SEND_CONCURRENCY):
+                await queue.put(None)
+
+    async def _send(batch: list[dict]) -> tuple[int, int, int]:
+        """Post one batch, returning (symbols, files sent, files failed)."""
+        try:
+            body, headers = await asyncio.to_thread(_encode_batch, repo_name, batch)
+            r = await _client.post("/parse_batch", content=body, headers=headers, timeout=BATCH_TIMEOUT)
+            r.raise_for_status()
+            data = orjson.loads(r.content)
+            processed = data.get("files_processed", 0)
+            # Files the engine didn't report as processed count as failed, never as silently absent
+            return data.get("total_symbols", 0), processed, max(len(batch) - processed, 0)
+        except Exception as e:
+            log.warning("Failed to parse batch of %d files (%s...): %s", len(batch), batch[0]["filename"], e)
+            return 0, 0, len(batch)
+
+    async def _consume() -> tuple[int, int, int]:
+        symbols = sent = failed = 0
+        while (batch := await queue.get()) is not None:
+            s, ok, bad = await _send(batch)
+            symbols += s
+            sent += ok
+            failed += bad
+        return symbols, sent, failed
+
+    _, *results = await asyncio.gather(_produce(), *[_consume() for _ in range(SEND_CONCURRENCY)])
+    total_symbols = sum(r[0] for r in results)
+    files_sent = sum(r[1] for r in results)
+    files_failed = sum(r[2] for r in results)
 
     files_skipped = files_failed
-    file_paths = [rel for rel, _ in files_to_parse]
     log.info("Parsed %d files (%d skipped), %d symbols total", files_sent, files_skipped, total_symbols)
     return {"files_processed": files_sent, "files_skipped": files_skipped, "nodes_created": total_symbols, "file_paths": file_paths}
 
 
+async def engine_version() -> str | None:
+    """Engine build version reported by /health, or None if it can't be determined."""
+    try:
+        r = await _client.get("/health")
+        return r.json().get("version")
+    except Exception as e:
+        log.warning("Could not read engine version: %s", e)
+        return None
+
+
 async def classify_repo(repo_name: str) -> dict:
     r = await _client.post("/classify", json={"repo_name": repo_name})
     return r.json()
@@ -1,10 +1,18 @@
-import json, asyncio, logging, time
+import asyncio, logging, time
+import orjson
 from langchain_core.messages import SystemMessage, HumanMessage
 from app.llm import get_llm
 from app.models import DocPage, RefineRouter, MetaUpdate, NavigationUpdate
 
 log = logging.getLogger("agent")
 
+# Built once at import on the shared client (get_llm is cached), like the generate runnables
+llm = get_llm()
+router_llm = llm.with_structured_output(RefineRouter)
+meta_llm = llm.with_structured_output(MetaUpdate)
+page_writer_llm = llm.with_structured_output(DocPage)
+nav_llm = llm.with_structured_output(NavigationUpdate)
+
 ROUTER_PROMPT = """You are a documentation routing agent. Given a table of contents with page summaries and a user's refinement request, identify which pages need to be modified.
 
 - page_ids: array of page IDs that need content changes
@@ -30,12 +38,7 @@ Rules:
 
 
 async def refine_docs(current_docs: dict, prompt: str, repo_name: str) -> dict:
-    t0 = time.time()
-    llm = get_llm()
-    router_llm = llm.with_structured_output(RefineRouter)
-    meta_llm = llm.with_structured_output(MetaUpdate)
-    page_writer_llm = llm.with_structured_output(DocPage)
-    nav_llm = llm.with_structured_output(NavigationUpdate)
+    t0 = time.perf_counter()
 
     pages = current_docs.get("pages", {})
     navigation = current_docs.get("navigation", [])
@@ -101,12 +104,12 @@ Instruction: {strategy}"""
         if not include_navigation:
             return
         try:
-            nav_json = json.dumps(navigation, indent=2)
+            nav_json = orjson.dumps(navigation, option=orjson.OPT_INDENT_2).decode()
             all_page_ids = list(pages.keys())
             nav_msg = f"""Current navigation:
 {nav_json}
 
-All available page IDs: {json.dumps(all_page_ids)}
+All available page IDs: {orjson.dumps(all_page_ids).decode()}
 
 Instruction: {strategy}"""
             nav_result: NavigationUpdate = await asyncio.wait_for(
@@ -125,9 +128,9 @@ Instruction: {strategy}"""
         if not page_data:
             return page_id, page_data or {}
 
-        page_json = json.dumps(page_data, indent=2)
+        page_json = orjson.dumps(page_data, option=orjson.OPT_INDENT_2).decode()
         if len(page_json) > 15000:
-            page_json = json.dumps(page_data)[:15000]
+            page_json = orjson.dumps(page_data).decode()[:15000]
 
         user_msg = f"""Page "{page_id}" from "{repo_name}" docs:
 {page_json}
@@ -168,5 +171,5 @@ Instruction: {strategy}"""
         if page_data:
             updated_docs["pages"][page_id] = page_data
 
-    log.info("[refine] Done in %.1fs -- refined %d pages", time.time() - t0, len(page_ids_to_refine))
+    log.info("[refine] Done in %.1fs -- refined %d pages", time.perf_counter() - t0, len(page_ids_to_refine))
     return updated_docs
@@ -1,12 +1,14 @@
-import asyncio, os, shutil, logging, time
+import asyncio, hashlib, os, shutil, logging, tempfile, time
+import orjson
+from collections import OrderedDict
 from typing import TypedDict, Optional, Callable
 from langgraph.graph import StateGraph, END
-from app.nodes.clone import clone_repo, get_repo_name
-from app.nodes.parse import parse_repo, query_graph
+from app.nodes.clone import clone_repo, get_repo_name, head_commit
+from app.nodes.parse import parse_repo, query_graph, list_repo_files, engine_version
 from app.nodes.generate import generate_docs, PageCallback
-from app.llm import get_llm
+from app.disk_cache import DiskCache
+from app.llm import cached_invoke, get_llm
 from app.models import ClassifyResult
-from langchain_core.messages import SystemMessage, HumanMessage
 
 log = logging.getLogger("agent")
 
@@ -20,69 +22,143 @@ Choose exactly ONE doc_type:
 - "library" -- reusable library/package docs (installation, usage, API, examples)
 - "cli" -- command-line tool docs (commands, flags, configuration, examples)"""
 
+# Parse stats and structure persisted per (repo_url, commit, engine version), so re-runs of an
+# unchanged repo skip the engine entirely; set PARSE_CACHE_DIR empty to disable
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "betterdocs_parse_cache"))
+PARSE_CACHE_MAX_ENTRIES = int(os.getenv("PARSE_CACHE_MAX_ENTRIES", "200"))
+# Bump when the cached entry layout or the agent-side file filtering changes
+_PARSE_CACHE_SCHEMA = 1
+_parse_cache = DiskCache(PARSE_CACHE_DIR, PARSE_CACHE_MAX_ENTRIES) if PARSE_CACHE_DIR else None
+
 class PipelineState(TypedDict):
     repo_url: str
     repo_path: Optional[str]
     repo_name: Optional[str]
+    head_sha: Optional[str]
     doc_type: Optional[str]
     github_token: Optional[str]
     index_stats: Optional[dict]
     file_paths: Optional[list]
+    parse_cache_key: Optional[str]
     structure: Optional[list]
+    total_symbols: Optional[int]
     classification: Optional[dict]
     readme: Optional[str]
     docs: Optional[dict]
     error: Optional[str]
 
-async def clone_node(state: PipelineState) -> PipelineState:
+# Nodes return partial updates: classify runs in parallel with parse/structure,
+# and LangGraph rejects two branches writing the same key in one step.
+
+async def clone_node(state: PipelineState) -> dict:
     log.info("[1/5 clone] Cloning %s", state["repo_url"])
-    t = time.time()
+    t = time.perf_counter()
     try:
         path = await clone_repo(state["repo_url"], state.get("github_token"))
         name = get_repo_name(state["repo_url"])
-        readme = ""
-        for f in ["README.md", "readme.md", "README.rst", "README"]:
-            rp = os.path.join(path, f)
-            if os.path.exists(rp):
-                readme = await asyncio.to_thread(_read_file, rp)
-                break
-        log.info("[1/5 clone] Done in %.1fs -- name=%s readme=%d chars path=%s", time.time()-t, name, len(readme), path)
-        return {**state, "repo_path": path, "repo_name": name, "readme": readme}
+        # README read and file listing are independent disk walks, so they run side by side.
+        # Listed here (not by parse) so classification can start without waiting for the engine
+        readme, file_paths, head = await asyncio.gather(
+            asyncio.to_thread(_read_readme, path),
+            asyncio.to_thread(list_repo_files, path),
+            head_commit(path),
+        )
+        log.info("[1/5 clone] Done in %.1fs -- name=%s head=%s readme=%d chars files=%d path=%s",
+                 time.perf_counter()-t, name, head, len(readme), len(file_paths), path)
+        return {"repo_path": path, "repo_name": name, "head_sha": head, "readme": readme, "file_paths": file_paths}
     except Exception as e:
         log.error("[1/5 clone] FAILED: %s", e)
-        return {**state, "error": str(e)}
-
-
-def _read_file(path: str) -> str:
-    with open(path) as fh:
-        return fh.read()
+        return {"error": str(e)}
+
+
+README_CANDIDATES = ("README.md", "readme.md", "README.rst", "README")
+# Prompts use at most a few thousand chars of the README; generated READMEs can run to megabytes
+README_MAX_BYTES = 64 * 1024
+
+
+def _read_readme(repo_path: str) -> str:
+    # One directory listing instead of a stat per candidate
+    with os.scandir(repo_path) as it:
+        entries = {e.name: e for e in it if e.is_file()}
+    for f in README_CANDIDATES:
+        if f in entries:
+            with open(entries[f].path, "rb") as fh:
+                raw = fh.read(README_MAX_BYTES + 1)
+            if len(raw) > README_MAX_BYTES:
+                log.warning("README %s exceeds %d bytes, truncating", f, README_MAX_BYTES)
+                raw = raw[:README_MAX_BYTES]
+            return raw.decode("utf-8", errors="replace")
+    return ""
+
+
+async def _parse_cache_key(state: PipelineState) -> str | None:
+    """Cache key for this commit as parsed by the running engine; None (no caching) if either is unknown."""
+    if not _parse_cache or not state.get("head_sha"):
+        return None
+    version = await engine_version()
+    if not version:
+        return None
+    raw = f"{_PARSE_CACHE_SCHEMA}\0{version}\0{state['repo_url']}\0{state['head_sha']}"
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def _load_parse_cache(key: str) -> dict | None:
+    data = _parse_cache.get(key)
+    if data is None:
+        return None
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError as e:
+        log.warning("Ignoring unreadable parse cache entry %s: %s", key, e)
+        return None
 
 
-async def parse_node(state: PipelineState) -> PipelineState:
+async def parse_node(state: PipelineState) -> dict:
     if state.get("error"):
-        return state
-    log.info("[2/5 parse] Sending to engine: %s", state["repo_name"])
-    t = time.time()
+        return {}
+    t = time.perf_counter()
     try:
-        stats = await parse_repo(state["repo_path"], state["repo_name"])
-        log.info("[2/5 parse] Done in %.1fs -- %s", time.time()-t, stats)
-        return {**state, "index_stats": stats, "file_paths": stats.get("file_paths", [])}
+        key = await _parse_cache_key(state)
+        if key and (cached := await asyncio.to_thread(_load_parse_cache, key)):
+            # Same commit and engine as an earlier run: reuse its stats and structure, structure_node skips the engine too
+            log.info("[2/5 parse] Cache hit for %s@%s", state["repo_name"], state["head_sha"][:12])
+            return cached
+        log.info("[2/5 parse] Sending to engine: %s", state["repo_name"])
+        # clone_node already listed the candidate files; reuse that instead of walking the tree again
+        stats = await parse_repo(state["repo_path"], state["repo_name"], state.get("file_paths"))
+        log.info("[2/5 parse] Done in %.1fs -- %s", time.perf_counter()-t, stats)
+        return {"index_stats": stats, "parse_cache_key": key}
     except Exception as e:
         log.error("[2/5 parse] FAILED: %s", e)
-        return {**state, "error": f"Parse failed: {e}"}
+        return {"error": f"Parse failed: {e}"}
     finally:
-        # Repo is no longer needed after parsing -- free disk space early
+        # Repo is no longer needed after parsing -- free disk space early, without holding up structure
         if state.get("repo_path"):
-            await asyncio.to_thread(shutil.rmtree, state["repo_path"], True)
+            _remove_in_background(state["repo_path"])
+
+
+# Strong refs so pending cleanups aren't garbage-collected mid-delete
+_cleanup_tasks: set[asyncio.Task] = set()
+
+
+def _remove_in_background(path: str) -> None:
+    task = asyncio.create_task(asyncio.to_thread(shutil.rmtree, path, True))
+    _cleanup_tasks.add(task)
+    task.add_done_callback(_cleanup_tasks.discard)
+
+# Classifications reused within this process, keyed by prompt digest (LLM_CACHE_DIR also persists them across restarts)
+_CLASSIFY_CACHE_MAX_ENTRIES = 256
+_classify_cache: OrderedDict[bytes, ClassifyResult] = OrderedDict()
+
 
-async def classify_node(state: PipelineState) -> PipelineState:
+async def classify_node(state: PipelineState) -> dict:
     if state.get("error"):
-        return state
+        return {}
     if state.get("doc_type"):
         log.info("[3/5 classify] Skipped -- user provided doc_type=%s", state["doc_type"])
-        return state
+        return {}
     log.info("[3/5 classify] LLM-classifying %s", state["repo_name"])
-    t = time.time()
+    t = time.perf_counter()
     try:
         file_paths = state.get("file_paths", [])
         readme = state.get("readme", "")
@@ -97,49 +173,61 @@ README (first 3000 chars):
 File tree:
 {file_tree}"""
 
-        result: ClassifyResult = await asyncio.wait_for(
-            _classify_llm.ainvoke([
-                SystemMessage(content=CLASSIFY_PROMPT),
-                HumanMessage(content=user_msg),
-            ]),
-            timeout=45,
-        )
-
-        log.info("[3/5 classify] Done in %.1fs -- %s (%s)", time.time()-t, result.doc_type, result.reasoning)
-        return {**state, "doc_type": result.doc_type, "classification": result.model_dump()}
+        # Keyed on the prompt rather than repo_name, so a re-run of an unchanged repo reuses the
+        # earlier result while a changed README or file list is classified afresh
+        key = hashlib.blake2b(user_msg.encode(), digest_size=16).digest()
+        result = _classify_cache.get(key)
+        if result is not None:
+            _classify_cache.move_to_end(key)
+        else:
+            result = await asyncio.wait_for(
+                cached_invoke(_classify_llm, ClassifyResult, CLASSIFY_PROMPT, user_msg, {}),
+                timeout=45,
+            )
+            _classify_cache[key] = result
+            if len(_classify_cache) > _CLASSIFY_CACHE_MAX_ENTRIES:
+                _classify_cache.popitem(last=False)
+
+        log.info("[3/5 classify] Done in %.1fs -- %s (%s)", time.perf_counter()-t, result.doc_type, result.reasoning)
+        return {"doc_type": result.doc_type, "classification": result.model_dump()}
     except Exception as e:
         log.error("[3/5 classify] FAILED: %s", e)
-        return {**state, "doc_type": "devdocs", "classification": {"error": str(e)}}
+        return {"doc_type": "devdocs", "classification": {"error": str(e)}}
 
-async def structure_node(state: PipelineState) -> PipelineState:
-    if state.get("error"):
-        return state
+async def structure_node(state: PipelineState) -> dict:
+    if state.get("error") or state.get("structure") is not None:
+        return {}
     log.info("[4/5 structure] Querying graph for %s", state["repo_name"])
-    t = time.time()
+    t = time.perf_counter()
     try:
         result = await query_graph(state["repo_name"], "structure")
         structure = result.get("structure", [])
-        total_symbols = sum(len(f.get("symbols", [])) for f in structure)
-        log.info("[4/5 structure] Done in %.1fs -- %d files, %d symbols", time.time()-t, len(structure), total_symbols)
-        return {**state, "structure": structure}
+        total_symbols = sum(map(len, (f.get("symbols") or () for f in structure)))
+        log.info("[4/5 structure] Done in %.1fs -- %d files, %d symbols", time.perf_counter()-t, len(structure), total_symbols)
+        stats = state.get("index_stats") or {}
+        # Partial parses (failed batches) and empty structures aren't cached, so the next run retries them
+        if structure and not stats.get("files_skipped") and (key := state.get("parse_cache_key")):
+            entry = orjson.dumps({"index_stats": stats, "structure": structure, "total_symbols": total_symbols})
+            await asyncio.to_thread(_parse_cache.put, key, entry)
+        return {"structure": structure, "total_symbols": total_symbols}
     except Exception as e:
         log.error("[4/5 structure] FAILED: %s", e)
-        return {**state, "error": f"Structure query failed: {e}"}
+        return {"error": f"Structure query failed: {e}"}
 
-async def generate_node(state: PipelineState) -> PipelineState:
+async def generate_node(state: PipelineState) -> dict:
     if state.get("error"):
-        return state
+        return {}
     log.info("[5/5 generate] Generating %s docs for %s (%d files in structure)",
              state["doc_type"], state["repo_name"], len(state.get("structure", [])))
-    t = time.time()
+    t = time.perf_counter()
     try:
         docs = await generate_docs(state["structure"], state["doc_type"], state["repo_name"], state.get("readme", ""))
         pages = docs.get("pages", {})
-        log.info("[5/5 generate] Done in %.1fs -- %d pages generated", time.time()-t, len(pages))
-        return {**state, "docs": docs}
+        log.info("[5/5 generate] Done in %.1fs -- %d pages generated", time.perf_counter()-t, len(pages))
+        return {"docs": docs}
     except Exception as e:
         log.error("[5/5 generate] FAILED: %s", e)
-        return {**state, "error": f"Generation failed: {e}"}
+        return {"error": f"Generation failed: {e}"}
 
 def build_pipeline():
     graph = StateGraph(PipelineState)
@@ -149,13 +237,13 @@ def build_pipeline():
     graph.add_node("structure", structure_node)
     graph.add_node("generate", generate_node)
     graph.set_entry_point("clone")
+    # Fan-out: classification only needs the README and file listing from clone,
+    # so it runs alongside parse -> structure
     graph.add_edge("clone", "parse")
-    # Fan-out: classify and structure are independent, run concurrently
-    graph.add_edge("parse", "classify")
+    graph.add_edge("clone", "classify")
     graph.add_edge("parse", "structure")
-    # Fan-in: generate waits for both
-    graph.add_edge("classify", "generate")
-    graph.add_edge("structure", "generate")
+    # Fan-in: generate waits for both branches
+    graph.add_edge(["classify", "structure"], "generate")
     graph.add_edge("generate", END)
     return graph.compile()
 
@@ -176,50 +264,59 @@ async def run_pipeline_streaming(
         "repo_url": repo_url,
         "repo_path": None,
         "repo_name": None,
+        "head_sha": None,
         "doc_type": doc_type,
         "github_token": github_token,
         "index_stats": None,
         "file_paths": None,
+        "parse_cache_key": None,
         "structure": None,
+        "total_symbols": None,
         "classification": None,
         "readme": None,
         "docs": None,
         "error": None,
     }
 
+    # This runner is the state's only owner, so node updates are merged in place
     # Step 1: Clone
     on_progress("clone", 5, "Cloning repository...")
-    state = await clone_node(state)
+    state.update(await clone_node(state))
     if state.get("error"):
         return {"error": state["error"]}
 
-    # Step 2: Parse
-    on_progress("parse", 15, "Parsing codebase with tree-sitter...")
-    state = await parse_node(state)
-    if state.get("error"):
-        return {"error": state["error"]}
+    # Classification only needs the README and file listing, so it overlaps parse + structure.
+    # A user-provided doc_type skips the step entirely.
+    classify_task = None if doc_type else asyncio.create_task(classify_node(state))
 
-    stats = state.get("index_stats", {})
-    file_count = stats.get("files_processed", stats.get("files_indexed", "?"))
-    on_progress("parse", 25, f"Parsed {file_count} files")
-
-    # Steps 3+4: Classify and Structure run concurrently
-    on_progress("classify", 28, "Classifying & building structure...")
-
-    classify_task = asyncio.create_task(classify_node(state))
-    structure_task = asyncio.create_task(structure_node(state))
-    classify_result, structure_result = await asyncio.gather(classify_task, structure_task)
-
-    # Merge results from both concurrent steps
-    state = {**state, **classify_result, **structure_result}
+    try:
+        # Step 2: Parse
+        on_progress("parse", 15, "Parsing codebase with tree-sitter...")
+        state.update(await parse_node(state))
+        if state.get("error"):
+            return {"error": state["error"]}
+
+        stats = state.get("index_stats", {})
+        file_count = stats.get("files_processed", stats.get("files_indexed", "?"))
+        on_progress("parse", 25, f"Parsed {file_count} files")
+
+        # Steps 3+4: Structure, then join the classification started after clone
+        on_progress("classify", 28, "Classifying & building structure..." if classify_task else "Building structure...")
+        state.update(await structure_node(state))
+        if classify_task and not state.get("error"):
+            state.update(await classify_task)
+    finally:
+        if classify_task:
+            classify_task.cancel()
 
     if state.get("error"):
         return {"error": state["error"]}
 
-    on_progress("classify", 32, f"Doc type: {state.get('doc_type', 'devdocs')}")
+    if classify_task:
+        on_progress("classify", 32, f"Doc type: {state.get('doc_type', 'devdocs')}")
 
     structure = state.get("structure", [])
-    total_symbols = sum(len(f.get("symbols", [])) for f in structure)
+    total_symbols = state.get("total_symbols") or 0
     on_progress("structure", 38, f"Mapped {len(structure)} files, {total_symbols} symbols")
 
     # Step 5: Generate
@@ -1,5 +1,9 @@
-use axum::{routing::{get, post}, Router, response::Json, extract::State};
+use axum::{routing::{get, post}, Router, response::Json, extract::{DefaultBodyLimit, State}, http::{header, HeaderMap, StatusCode}, body::Bytes};
+use flate2::read::GzDecoder;
+use futures::stream::{self, StreamExt};
+use rayon::prelude::*;
 use serde_json::{json, Value};
+use std::io::Read;
 use std::net::SocketAddr;
 use std::sync::Arc;
 use tower_http::cors::{CorsLayer, Any};
@@ -12,6 +16,8 @@ mod classifier;
 
 use graph::GraphClient;
 
+const PARSE_BATCH_BODY_LIMIT: usize = 8 * 1024 * 1024;
+
 struct AppState {
     graph: Option<Arc<GraphClient>>,
 }
@@ -57,6 +63,8 @@ async fn main() {
         .route("/health", get(health_check))
         .route("/index", post(index_repo))
         .route("/parse", post(parse_file))
+        // Batches carry up to ~2MB of source plus JSON framing; gzip bodies are capped again after decoding
+        .route("/parse_batch", post(parse_batch).layer(DefaultBodyLimit::max(PARSE_BATCH_BODY_LIMIT)))
         .route("/classify", post(classify_repo))
         .route("/graph/query", post(query_graph))
         .layer(cors)
@@ -74,7 +82,8 @@ async fn main() {
 
 async fn health_check(State(state): State<Arc<AppState>>) -> Json<Value> {
     let db = if state.graph.is_some() { "connected" } else { "disconnected" };
-    Json(json!({ "status": "ok", "service": "better-docs", "database": db }))
+    // The agent keys its parse cache on this, so bump the crate version when parse output changes
+    Json(json!({ "status": "ok", "service": "better-docs", "database": db, "version": env!("CARGO_PKG_VERSION") }))
 }
 
 #[derive(serde::Deserialize)]
@@ -115,6 +124,90 @@ async fn parse_file(State(state): State<Arc<AppState>>, Json(payload): Json<Pars
     Json(json!({ "parsing": result, "ingested": ingested }))
 }
 
+#[derive(serde::Deserialize)]
+struct ParseBatchFile {
+    filename: String,
+    content: String,
+}
+
+#[derive(serde::Deserialize)]
+struct ParseBatchRequest {
+    files: Vec<ParseBatchFile>,
+    repo_name: Option<String>,
+}
+
+type ApiError = (StatusCode, Json<Value>);
+
+fn api_error(status: StatusCode, message: String) -> ApiError {
+    (status, Json(json!({ "error": message })))
+}
+
+/// Deserialize a /parse_batch body, gunzipping it first when sent with `Content-Encoding: gzip`.
+fn decode_batch_body(headers: &HeaderMap, body: &[u8]) -> Result<ParseBatchRequest, ApiError> {
+    let gzip = headers.get(header::CONTENT_ENCODING)
+        .map_or(false, |v| v.as_bytes().eq_ignore_ascii_case(b"gzip"));
+    let decoded;
+    let raw = if gzip {
+        let mut out = Vec::new();
+        GzDecoder::new(body).take(PARSE_BATCH_BODY_LIMIT as u64 + 1).read_to_end(&mut out)
+            .map_err(|e| api_error(StatusCode::BAD_REQUEST, format!("invalid gzip body: {}", e)))?;
+        if out.len() > PARSE_BATCH_BODY_LIMIT {
+            return Err(api_error(StatusCode::PAYLOAD_TOO_LARGE, format!("decoded body exceeds {} bytes", PARSE_BATCH_BODY_LIMIT)));
+        }
+        decoded = out;
+        &decoded[..]
+    } else {
+        body
+    };
+    serde_json::from_slice(raw).map_err(|e| api_error(StatusCode::UNPROCESSABLE_ENTITY, format!("invalid batch: {}", e)))
+}
+
+async fn parse_batch(State(state): State<Arc<AppState>>, headers: HeaderMap, body: Bytes) -> Result<Json<Value>, ApiError> {
+    let payload = decode_batch_body(&headers, &body)?;
+    debug!("POST /parse_batch -- {} files", payload.files.len());
+    let files = payload.files;
+
+    // Parse the whole batch on the rayon pool so tree-sitter work doesn't block the tokio runtime
+    let parsed: Vec<(String, parsing::ParsingResult)> = tokio::task::spawn_blocking(move || {
+        files.into_par_iter()
+            .map(|f| {
+                let result = parsing::parse_content(&f.filename, &f.content);
+                (f.filename, result)
+            })
+            .collect()
+    }).await.map_err(|e| {
+        // A parser panic must fail the batch, not report it as parsed with zero files
+        error!("  Batch parse task failed: {}", e);
+        api_error(StatusCode::INTERNAL_SERVER_ERROR, format!("batch parse failed: {}", e))
+    })?;
+
+    let ingested: Vec<bool> = if let (Some(client), Some(repo)) = (&state.graph, &payload.repo_name) {
+        stream::iter(parsed.iter())
+            .map(|(filename, result)| async move {
+                match client.ingest_symbols(repo, filename, result).await {
+                    Ok(_) => true,
+                    Err(e) => { error!("  Neo4j ingest failed for {}: {}", filename, e); false }
+                }
+            })
+            .buffered(16)
+            .collect()
+            .await
+    } else {
+        vec![false; parsed.len()]
+    };
+
+    let total_symbols: usize = parsed.iter().map(|(_, r)| r.symbols.len()).sum();
+    debug!("  Parsed batch: {} files, {} symbols", parsed.len(), total_symbols);
+    let results: Vec<Value> = parsed.iter().zip(ingested)
+        .map(|((filename, result), ingested)| json!({
+            "filename": filename,
+            "symbols": result.symbols.len(),
+            "ingested": ingested,
+        }))
+        .collect();
+    Ok(Json(json!({ "results": results, "files_processed": parsed.len(), "total_symbols": total_symbols })))
+}
+
 #[derive(serde::Deserialize)]
 struct ClassifyRequest {
     repo_name: String,